@@ -2,6 +2,7 @@ import sys
 
 import six
 
+from redis.connection import parse_url
 from scrapy.utils.misc import load_object
 
 from . import defaults
@@ -77,6 +78,66 @@ def get_redis_from_settings(settings):
 from_settings = get_redis_from_settings
 
 
+def get_redis_async_from_settings(settings):
+    """Returns a txredisapi connection pool from given Scrapy settings object.
+
+    The returned client issues commands through the Twisted reactor instead
+    of blocking it, returning Deferreds. Requires the optional ``txredisapi``
+    package. Connection parameters mirror the ones ``get_redis_from_settings``
+    honors, so both clients end up on the same server.
+
+    Parameters
+    ----------
+    settings : Settings
+        A scrapy settings object. See the supported settings below.
+
+    Returns
+    -------
+    server
+        txredisapi lazy connection pool.
+
+    Other Parameters
+    ----------------
+    REDIS_URL : str, optional
+        Server connection URL (``redis://`` only); takes precedence over the
+        host/port/db settings, as in the blocking client.
+    REDIS_HOST : str, optional
+        Server host.
+    REDIS_PORT : int, optional
+        Server port.
+    REDIS_DB : int, optional
+        Server database.
+    REDIS_PARAMS : dict, optional
+        Additional client parameters; only ``password`` is honored here.
+
+    """
+    try:
+        import txredisapi
+    except ImportError:
+        raise ImportError(
+            "REDIS_ASYNC_CLIENT=True requires the 'txredisapi' package"
+        )
+    params = {
+        'host': settings.get('REDIS_HOST', 'localhost'),
+        'port': settings.getint('REDIS_PORT', 6379),
+        'dbid': settings.getint('REDIS_DB', 0),
+        'password': settings.getdict('REDIS_PARAMS').get('password'),
+    }
+    url = settings.get('REDIS_URL')
+    if url:
+        if not url.startswith('redis://'):
+            # Silently dropping e.g. TLS would connect somewhere unintended.
+            raise ValueError(
+                "REDIS_ASYNC_CLIENT only supports redis:// URLs, got %r" % url)
+        url_params = parse_url(url)
+        params['host'] = url_params.get('host', params['host'])
+        params['port'] = url_params.get('port', params['port'])
+        params['dbid'] = url_params.get('db', params['dbid'])
+        if url_params.get('password'):
+            params['password'] = url_params['password']
+    return txredisapi.lazyConnectionPool(**params)
+
+
 def get_redis(**kwargs):
     """Returns a redis client instance.
 
@@ -24,3 +24,6 @@ SCHEDULER_DUPEFILTER_CLASS = 'scrapy_redis.dupefilter.RFPDupeFilter'
 START_URLS_KEY = '%(name)s:start_urls'
 START_URLS_AS_SET = False
 START_URLS_AS_ZSET = False
+START_URLS_CHECK_INTERVAL = 1.0
+START_URLS_PREFETCH_BATCHES = 1
+ASYNC_CLIENT = False
@@ -90,6 +90,13 @@ class FifoQueue(Base):
 class PriorityQueue(Base):
     """Per-spider priority queue abstraction using redis' sorted set"""
 
+    def __init__(self, *args, **kwargs):
+        super(PriorityQueue, self).__init__(*args, **kwargs)
+        # Reused across pops: execute() resets the command stack, and the
+        # scheduler pops from a single thread. Saves a Pipeline allocation
+        # per popped request.
+        self._pipe = self.server.pipeline()
+
     def __len__(self):
         """Return the length of the queue"""
         return self.server.zcard(self.key)
@@ -109,7 +116,7 @@ class PriorityQueue(Base):
         timeout not support in this queue class
         """
         # use atomic range/remove using multi/exec
-        pipe = self.server.pipeline()
+        pipe = self._pipe
         pipe.multi()
         pipe.zrange(self.key, 0, 0).zremrangebyrank(self.key, 0, 0)
         results, count = pipe.execute()
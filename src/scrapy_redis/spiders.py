@@ -1,11 +1,59 @@
-from scrapy import signals
+import asyncio
+import collections
+import inspect
+
+from scrapy import Request, signals
+from scrapy.core.engine import ExecutionEngine
 from scrapy.exceptions import DontCloseSpider
 from scrapy.spiders import Spider, CrawlSpider
-from collections import Iterable
+from twisted.internet import task
 
 
 from . import connection, defaults
-from .utils import bytes_to_str
+
+# Scrapy removed the ``spider`` argument from ``ExecutionEngine.crawl``;
+# detect the installed signature once instead of per-request dispatch.
+_ENGINE_CRAWL_TAKES_SPIDER = (
+    'spider' in inspect.signature(ExecutionEngine.crawl).parameters
+)
+
+
+# Atomic batch pops: a single Lua script replaces the two-command pipeline
+# and closes the window where two workers could read overlapping ranges.
+_POP_LIST_SCRIPT = (
+    "local r = redis.call('lrange', KEYS[1], 0, ARGV[1] - 1) "
+    "redis.call('ltrim', KEYS[1], ARGV[1], -1) "
+    "return r"
+)
+_POP_ZSET_SCRIPT = (
+    "local r = redis.call('zrevrange', KEYS[1], 0, ARGV[1] - 1) "
+    "redis.call('zremrangebyrank', KEYS[1], -ARGV[1], -1) "
+    "return r"
+)
+
+
+def _script_popper(script):
+    """Returns a ``fetch_data`` callable bound directly to a pop script."""
+    def fetch_data(redis_key, batch_size):
+        return script(keys=[redis_key], args=[batch_size])
+    return fetch_data
+
+
+def _lpop_popper(server):
+    """Returns a ``fetch_data`` using the native batch LPOP (redis 7.0+)."""
+    def fetch_data(redis_key, batch_size):
+        return server.lpop(redis_key, batch_size) or []
+    return fetch_data
+
+
+def _zmpop_popper(server):
+    """Returns a ``fetch_data`` using the native ZMPOP (redis 7.0+)."""
+    def fetch_data(redis_key, batch_size):
+        result = server.zmpop(1, [redis_key], max=True, count=batch_size)
+        if not result:
+            return []
+        return [member for member, _ in result[1]]
+    return fetch_data
 
 
 class RedisMixin(object):
@@ -17,10 +65,51 @@ class RedisMixin(object):
     # Redis client placeholder.
     server = None
 
-    def start_requests(self): 
+    # Periodic top-up task placeholder.
+    _topup_task = None
+
+    # Whether start-URL fetches go through the non-blocking client.
+    redis_async = False
+
+    # Prefetch buffer placeholder (deque when prefetching is enabled).
+    _prefetch_buf = None
+
+    # Whether the unreadable-engine-state warning has been emitted.
+    _engine_state_warned = False
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        obj = super(RedisMixin, cls).from_crawler(crawler, *args, **kwargs)
+        obj.setup_redis(crawler)
+        return obj
+
+    def start_requests(self):
         """Returns a batch of start requests from redis."""
+        if self.redis_async:
+            # The non-blocking client cannot be consumed synchronously; the
+            # first batch is scheduled by the top-up task/idle signal.
+            return iter([])
         return self.next_requests() # 第100行左右，有 next_requests 方法体， 109行yield request, 后面发生了什么?
 
+    if hasattr(Spider, 'start'):
+        async def start(self):
+            """Returns a batch of start requests from redis (Scrapy 2.13+).
+
+            With the blocking client the redis fetch runs in a thread so the
+            reactor stays responsive while the first batch is read; with
+            REDIS_ASYNC_CLIENT the Deferred is awaited directly.
+            """
+            if self.redis_async:
+                from scrapy.utils.defer import maybe_deferred_to_future
+                datas = await maybe_deferred_to_future(
+                    self.fetch_data(self.redis_key, self.redis_batch_size))
+            else:
+                datas = await asyncio.to_thread(
+                    self.fetch_data, self.redis_key, self.redis_batch_size,
+                )
+            for req in self._requests_from_datas(datas):
+                yield req
+
     def setup_redis(self, crawler=None): # 这个方法什么时候调用呢？在170行和200行， 两个子类Spider方法里调用。 from_crawler，构造一个spider实例的时候调用，所以是延迟调用的。
         """Setup redis connection and idle signal.
 
@@ -62,62 +151,208 @@ class RedisMixin(object):
         except (TypeError, ValueError):
             raise ValueError("redis_batch_size must be an integer")
 
+        # Target size of the in-flight pool: requests being downloaded plus
+        # requests waiting in the scheduler.
+        self.pool_size = settings.getint('CONCURRENT_REQUESTS') + self.redis_batch_size
+
         if self.redis_encoding is None: # 默认编码
             self.redis_encoding = settings.get('REDIS_ENCODING', defaults.REDIS_ENCODING)
 
         self.logger.info("Reading start URLs from redis key '%(redis_key)s' "
                          "(batch size: %(redis_batch_size)s, encoding: %(redis_encoding)s",
-                         self.__dict__)
+                         {
+                             'redis_key': self.redis_key,
+                             'redis_batch_size': self.redis_batch_size,
+                             'redis_encoding': self.redis_encoding,
+                         })
 
         self.server = connection.from_settings(crawler.settings)
 
-        if self.settings.getbool('REDIS_START_URLS_AS_SET', defaults.START_URLS_AS_SET):
-            self.fetch_data = self.server.spop
-        elif self.settings.getbool('REDIS_START_URLS_AS_ZSET', defaults.START_URLS_AS_ZSET):
-            self.fetch_data = self.pop_priority_queue
+        # Dedicated client (with its own connection pool) for start-URL
+        # fetches, so their latency does not contend with scheduler and
+        # dupefilter traffic on the shared client.
+        self._fetch_server = connection.from_settings(crawler.settings)
+
+        # redis-py caches the script SHA after the first call and sends
+        # EVALSHA from then on.
+        self._pop_list_script = self._fetch_server.register_script(_POP_LIST_SCRIPT)
+        self._pop_zset_script = self._fetch_server.register_script(_POP_ZSET_SCRIPT)
+
+        use_set = settings.getbool('REDIS_START_URLS_AS_SET', defaults.START_URLS_AS_SET)
+        use_zset = settings.getbool('REDIS_START_URLS_AS_ZSET', defaults.START_URLS_AS_ZSET)
+
+        # Optionally route start-URL fetches through a non-blocking
+        # txredisapi client so redis I/O overlaps with downloads instead of
+        # stalling the reactor. Set mode has no batch pop in txredisapi, so
+        # it stays on the blocking client.
+        self.redis_async = settings.getbool(
+            'REDIS_ASYNC_CLIENT', defaults.ASYNC_CLIENT,
+        )
+        if self.redis_async and use_set:
+            self.logger.warning(
+                "REDIS_ASYNC_CLIENT is not supported with "
+                "REDIS_START_URLS_AS_SET; falling back to blocking client")
+            self.redis_async = False
+
+        # Cheap size probe so an empty queue costs a single LLEN/SCARD/ZCARD
+        # instead of a full batch pop on every tick.
+        if use_set:
+            self._size_cmd = self._fetch_server.scard
+        elif use_zset:
+            self._size_cmd = self._fetch_server.zcard
         else:
-            self.fetch_data = self.pop_list_queue
+            self._size_cmd = self._fetch_server.llen
+
+        # Bind fetch_data to a callable that captures its target directly,
+        # so no ``self.`` attribute chain is walked per batch.
+        if self.redis_async:
+            self._async_server = connection.get_redis_async_from_settings(settings)
+            if use_zset:
+                self.fetch_data = self._pop_zset_queue_async
+            else:
+                self.fetch_data = self._pop_list_queue_async
+        elif use_set:
+            self.fetch_data = self._fetch_server.spop
+        elif use_zset:
+            if self._has_native_batch_pop():
+                self.fetch_data = _zmpop_popper(self._fetch_server)
+            else:
+                self.fetch_data = _script_popper(self._pop_zset_script)
+        else:
+            if self._has_native_batch_pop():
+                self.fetch_data = _lpop_popper(self._fetch_server)
+            else:
+                self.fetch_data = _script_popper(self._pop_list_script)
+
+        # Optionally prefetch several batches per round-trip and serve the
+        # surplus from a local buffer.
+        self._prefetch_batches = settings.getint(
+            'REDIS_START_URLS_PREFETCH_BATCHES',
+            defaults.START_URLS_PREFETCH_BATCHES,
+        )
+        if self._prefetch_batches > 1 and self.redis_async:
+            # The buffer wrapper consumes batches eagerly and cannot hold
+            # the Deferreds the async pops return.
+            self.logger.warning(
+                "REDIS_START_URLS_PREFETCH_BATCHES is not supported with "
+                "REDIS_ASYNC_CLIENT; prefetch disabled")
+            self._prefetch_batches = 1
+        if self._prefetch_batches > 1:
+            self._prefetch_buf = collections.deque()
+            self._fetch_data_inner = self.fetch_data
+            self.fetch_data = self._fetch_data_prefetched
+
+        # Periodically top up the downloader pool instead of waiting for the
+        # engine to go fully idle between batches.
+        check_interval = settings.getfloat(
+            'REDIS_START_URLS_CHECK_INTERVAL',
+            defaults.START_URLS_CHECK_INTERVAL,
+        )
+        self._topup_task = task.LoopingCall(self._maybe_schedule)
+        self._topup_task.start(check_interval, now=False)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
 
         # The idle signal is called when the spider has no requests left,
         # that's when we will schedule new requests from redis queue
         # spider任务下载完成了，就去拿取数据，这个非常有意思，这个信号量
         crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
 
+    def _has_native_batch_pop(self):
+        """Returns whether the server supports LPOP count/ZMPOP (redis 7.0+)."""
+        try:
+            version = self._fetch_server.info('server')['redis_version']
+            return tuple(int(x) for x in version.split('.')[:2]) >= (7, 0)
+        except Exception:
+            # Server unreachable or version not parseable; use the scripts.
+            return False
+
     def pop_list_queue(self, redis_key, batch_size):
-        with self.server.pipeline() as pipe:
-            pipe.lrange(redis_key, 0, batch_size - 1)
-            pipe.ltrim(redis_key, batch_size, -1)
-            datas, _ = pipe.execute()
-        return datas
+        return self._pop_list_script(keys=[redis_key], args=[batch_size])
 
     def pop_priority_queue(self, redis_key, batch_size):
-        with self.server.pipeline() as pipe:
-            pipe.zrevrange(redis_key, 0, batch_size - 1)
-            pipe.zremrangebyrank(redis_key, -batch_size, -1)
-            datas, _ = pipe.execute()
-        return datas
+        return self._pop_zset_script(keys=[redis_key], args=[batch_size])
+
+    def _pop_list_queue_async(self, redis_key, batch_size):
+        """Returns a Deferred firing with a batch popped from a list key.
+
+        Runs the same atomic Lua script as the blocking path, so concurrent
+        workers cannot read overlapping slices.
+        """
+        return self._async_server.eval(
+            _POP_LIST_SCRIPT, keys=[redis_key], args=[batch_size])
+
+    def _pop_zset_queue_async(self, redis_key, batch_size):
+        """Returns a Deferred firing with a batch popped from a zset key.
+
+        Runs the same atomic Lua script as the blocking path, so concurrent
+        workers cannot read overlapping slices.
+        """
+        return self._async_server.eval(
+            _POP_ZSET_SCRIPT, keys=[redis_key], args=[batch_size])
+
+    def _fetch_data_prefetched(self, redis_key, batch_size):
+        """Serves batches from a local buffer, refilled by over-sized pops.
+
+        When the buffer runs dry a single redis round-trip pops
+        ``batch_size * REDIS_START_URLS_PREFETCH_BATCHES`` messages, so the
+        per-batch redis latency is amortized over several batches.
+        """
+        buf = self._prefetch_buf
+        if not buf:
+            buf.extend(self._fetch_data_inner(
+                redis_key, batch_size * self._prefetch_batches,
+            ))
+        return [buf.popleft() for _ in range(min(batch_size, len(buf)))]
 
     def next_requests(self):
-        """Returns a request to be scheduled or none."""
+        """Returns a request to be scheduled or none.
+
+        The fetch count is sized to the free slots in the in-flight pool, so
+        a full pool does not over-fetch from redis and a drained one is
+        refilled in a single batch.
+        """
         # XXX: Do we need to use a timeout here?
+        fetch_n = self._next_fetch_count()
+        if fetch_n == 0:
+            return
+        # Skip the batch pop when the queue is empty — the common case on
+        # idle ticks during a slow crawl — unless the prefetch buffer still
+        # holds messages.
+        if not self._prefetch_buf and self._size_cmd(self.redis_key) == 0:
+            return
+        datas = self.fetch_data(self.redis_key, fetch_n)
+        for req in self._requests_from_datas(datas):
+            yield req
+
+    def _next_fetch_count(self):
+        """Returns how many messages the next fetch should request."""
+        in_flight = self.urls_in_work()
+        if in_flight is None:
+            return self.redis_batch_size
+        return max(0, self.pool_size - in_flight)
+
+    def _requests_from_datas(self, datas):
+        """Yields requests built from a batch of fetched redis messages."""
         found = 0
-        datas = self.fetch_data(self.redis_key, self.redis_batch_size)
-        for data in datas:
-            reqs = self.make_request_from_data(data) # 122行，见方法体
-            if isinstance(reqs, Iterable):
-                for req in reqs:
-                    yield req # 这里这个yiled request，让我感觉很好奇，到底请求去哪里了呢？ 109行需要好好调研一下。
-                    # XXX: should be here?
-                    found += 1
-                    self.logger.info(f'start req url:{req.url}')
-            elif reqs:
-                yield reqs
+        log_debug = self.logger.debug
+        for data, reqs in zip(datas, self.make_requests_from_data_batch(datas)):
+            # Single Request is by far the common case; anything else is
+            # treated as an iterable of requests (e.g. a generator from an
+            # overridden make_request_from_data).
+            if reqs is None:
+                log_debug("Request not made from data: %r", data)
+                continue
+            if isinstance(reqs, Request):
+                yield reqs # 这里这个yiled request，让我感觉很好奇，到底请求去哪里了呢？ 109行需要好好调研一下。
+                # XXX: should be here?
+                found += 1
+                continue
+            for req in reqs:
+                yield req
                 found += 1
-            else:
-                self.logger.debug("Request not made from data: %r", data)
 
         if found:
-            self.logger.debug("Read %s requests from '%s'", found, self.redis_key)
+            log_debug("Read %s requests from '%s'", found, self.redis_key)
 
     def make_request_from_data(self, data):
         """Returns a Request instance from data coming from Redis.
@@ -131,14 +366,125 @@ class RedisMixin(object):
             Message from redis.
 
         """
-        url = bytes_to_str(data, self.redis_encoding) # 解码
-        return self.make_requests_from_url(url) # scrapy 的内置方法
+        url = self._decode_and_filter(data) # 解码
+        if url is None:
+            return None
+        if hasattr(self, 'make_requests_from_url'):
+            # Deprecated Scrapy hook, honored when a subclass provides it.
+            return self.make_requests_from_url(url)
+        return Request(url, dont_filter=True)
+
+    def _decode_and_filter(self, data):
+        """Decodes a redis message to a stripped URL, or None when blank.
+
+        Decode, strip and empty-check happen in one pass so malformed rows
+        are skipped before any Request is allocated.
+        """
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode(self.redis_encoding)
+        data = data.strip()
+        return data or None
+
+    def make_requests_from_data_batch(self, datas):
+        """Returns requests built from a batch of redis messages.
+
+        Decodes the whole batch and builds the requests in a single
+        comprehension, avoiding a method call per message on the hot path.
+        Batches from subclasses that override ``make_request_from_data`` are
+        still built through that method, one message at a time.
+
+        Parameters
+        ----------
+        datas : list of bytes
+            Messages from redis.
+
+        """
+        if type(self).make_request_from_data is not RedisMixin.make_request_from_data:
+            return [self.make_request_from_data(data) for data in datas]
+        urls = [self._decode_and_filter(data) for data in datas]
+        make_req = getattr(self, 'make_requests_from_url', None)
+        if make_req is not None:
+            # Deprecated Scrapy hook, honored when a subclass provides it.
+            return [make_req(url) if url else None for url in urls]
+        return [Request(url, dont_filter=True) if url else None for url in urls]
 
     def schedule_next_requests(self):
         """Schedules a request if available"""
+        if self.redis_async:
+            fetch_n = self._next_fetch_count()
+            if fetch_n == 0:
+                return
+            d = self.fetch_data(self.redis_key, fetch_n)
+            d.addCallback(self._schedule_datas)
+            d.addErrback(self._schedule_datas_failed)
+            return
         # TODO: While there is capacity, schedule a batch of redis requests.
         for req in self.next_requests(): # zx: 100L 左右方法体，然后开始爬取方法
-            self.crawler.engine.crawl(req, spider=self)
+            self._crawl(req)
+
+    def _schedule_datas(self, datas):
+        """Schedules requests built from an asynchronously fetched batch."""
+        for req in self._requests_from_datas(datas):
+            self._crawl(req)
+
+    def _schedule_datas_failed(self, failure):
+        """Logs a failed async fetch so the error does not go unhandled.
+
+        Mirrors the containment _maybe_schedule gives the blocking path;
+        the next tick or idle signal simply retries.
+        """
+        self.logger.error("Error while fetching start requests: %s", failure)
+
+    def _crawl(self, request):
+        """Hands a request to the engine, using the installed crawl signature."""
+        if _ENGINE_CRAWL_TAKES_SPIDER:
+            self.crawler.engine.crawl(request, spider=self)
+        else:
+            self.crawler.engine.crawl(request)
+
+    def urls_in_work(self):
+        """Returns the number of requests queued or in progress, or None
+        when the engine state is not available yet."""
+        crawler = getattr(self, 'crawler', None)
+        engine = getattr(crawler, 'engine', None)
+        if engine is None:
+            return None
+        # The engine slot went private (``_slot``) in newer Scrapy.
+        slot = getattr(engine, 'slot', None)
+        if slot is None:
+            slot = getattr(engine, '_slot', None)
+        if slot is not None:
+            try:
+                return len(slot.scheduler) + len(slot.inprogress)
+            except TypeError:
+                pass
+        if getattr(engine, 'running', False) and not self._engine_state_warned:
+            # Warn once: without the slot counts, top-ups and fetch sizing
+            # degrade to fixed redis_batch_size batches on idle only.
+            self._engine_state_warned = True
+            self.logger.warning(
+                "Cannot read engine slot state; start-URL fetches fall back "
+                "to fixed redis_batch_size batches")
+        return None
+
+    def _maybe_schedule(self):
+        """Schedules a new batch when the in-flight pool runs low.
+
+        The pool is considered low when the number of requests queued in the
+        scheduler plus those in progress drops below half of
+        ``CONCURRENT_REQUESTS + redis_batch_size``.
+        """
+        try:
+            in_flight = self.urls_in_work()
+            if in_flight is None:
+                return
+            if in_flight < self.pool_size * 0.5:
+                self.schedule_next_requests()
+        except Exception:
+            # A transient failure (e.g. a redis connection error) must not
+            # stop the LoopingCall; the idle-signal path gets the same
+            # containment from Scrapy's signal handling.
+            self.logger.exception("Error while topping up start requests")
 
     def spider_idle(self):
         """Schedules a request if available, otherwise waits."""
@@ -146,6 +492,11 @@ class RedisMixin(object):
         self.schedule_next_requests() # zx:下一个请求，就是上面那个方法
         raise DontCloseSpider
 
+    def spider_closed(self, spider=None):
+        """Stops the periodic top-up task."""
+        if self._topup_task is not None and self._topup_task.running:
+            self._topup_task.stop()
+
 
 class RedisSpider(RedisMixin, Spider):
     """Spider that reads urls from redis queue when idle.
@@ -173,12 +524,6 @@ class RedisSpider(RedisMixin, Spider):
 
     """
 
-    @classmethod
-    def from_crawler(self, crawler, *args, **kwargs):
-        obj = super(RedisSpider, self).from_crawler(crawler, *args, **kwargs)
-        obj.setup_redis(crawler)
-        return obj
-
 
 class RedisCrawlSpider(RedisMixin, CrawlSpider):
     """Spider that reads urls from redis queue when idle.
@@ -204,9 +549,3 @@ class RedisCrawlSpider(RedisMixin, CrawlSpider):
         Default encoding to use when decoding messages from redis queue.
 
     """
-
-    @classmethod
-    def from_crawler(self, crawler, *args, **kwargs):
-        obj = super(RedisCrawlSpider, self).from_crawler(crawler, *args, **kwargs)
-        obj.setup_redis(crawler)
-        return obj
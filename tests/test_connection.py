@@ -1,4 +1,5 @@
 import mock
+import pytest
 
 from scrapy.settings import Settings
 
@@ -6,6 +7,7 @@ from scrapy_redis import defaults
 from scrapy_redis.connection import (
     from_settings,
     get_redis,
+    get_redis_async_from_settings,
     get_redis_from_settings,
 )
 
@@ -67,3 +69,34 @@ class TestFromSettings(object):
 
 def test_get_server_from_settings_alias():
     assert from_settings is get_redis_from_settings
+
+
+class TestGetRedisAsync(object):
+
+    def _get_pool(self, settings_dict):
+        txredisapi = mock.Mock()
+        import sys
+        with mock.patch.dict(sys.modules, {'txredisapi': txredisapi}):
+            get_redis_async_from_settings(Settings(settings_dict))
+        return txredisapi.lazyConnectionPool
+
+    def test_defaults(self):
+        pool = self._get_pool({})
+        pool.assert_called_with(
+            host='localhost', port=6379, dbid=0, password=None)
+
+    def test_url_takes_precedence(self):
+        pool = self._get_pool({
+            'REDIS_URL': 'redis://:pw@prod:6380/2',
+            'REDIS_HOST': 'other',
+        })
+        pool.assert_called_with(host='prod', port=6380, dbid=2, password='pw')
+
+    def test_password_from_params(self):
+        pool = self._get_pool({'REDIS_PARAMS': {'password': 'secret'}})
+        pool.assert_called_with(
+            host='localhost', port=6379, dbid=0, password='secret')
+
+    def test_rejects_non_redis_url(self):
+        with pytest.raises(ValueError):
+            self._get_pool({'REDIS_URL': 'rediss://prod:6380'})
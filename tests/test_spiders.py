@@ -5,6 +5,7 @@ import pytest
 from scrapy import signals
 from scrapy.exceptions import DontCloseSpider
 from scrapy.settings import Settings
+from twisted.internet.defer import Deferred
 
 from scrapy_redis.spiders import (
     RedisCrawlSpider,
@@ -109,7 +110,7 @@ class MockRequest(mock.Mock):
 ])
 @pytest.mark.parametrize('start_urls_as_zset', [False, True])
 @pytest.mark.parametrize('start_urls_as_set', [False, True])
-@mock.patch('scrapy.spiders.Request', MockRequest)
+@mock.patch('scrapy_redis.spiders.Request', MockRequest)
 def test_consume_urls_from_redis(start_urls_as_zset, start_urls_as_set, spider_cls):
     batch_size = 5
     redis_key = 'start:urls'
@@ -156,9 +157,111 @@ def test_consume_urls_from_redis(start_urls_as_zset, start_urls_as_set, spider_c
 
         if start_urls_as_zset or start_urls_as_set:
             crawler.engine.crawl.assert_has_calls([
-                mock.call(req, spider=spider) for req in reqs if req not in start_requests
+                mock.call(req) for req in reqs if req not in start_requests
             ], any_order=True)
         else:
             crawler.engine.crawl.assert_has_calls([
-                mock.call(req, spider=spider) for req in reqs[batch_size:]
+                mock.call(req) for req in reqs[batch_size:]
             ])
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_fetch_data_prefetched(connection):
+    crawler = get_crawler()
+    crawler.settings.setdict({'REDIS_START_URLS_PREFETCH_BATCHES': 3})
+    spider = MySpider.from_crawler(crawler)
+    assert spider.fetch_data == spider._fetch_data_prefetched
+    messages = [b'http://example.com/%d' % i for i in range(6)]
+    spider._fetch_data_inner = mock.Mock(return_value=list(messages))
+    # First call pops batch_size * prefetch batches in one round-trip.
+    assert spider._fetch_data_prefetched('key', 2) == messages[:2]
+    spider._fetch_data_inner.assert_called_once_with('key', 6)
+    # Later batches drain the buffer without touching redis.
+    assert spider._fetch_data_prefetched('key', 2) == messages[2:4]
+    assert spider._fetch_data_prefetched('key', 2) == messages[4:6]
+    assert spider._fetch_data_inner.call_count == 1
+    # A drained buffer triggers the next refill.
+    spider._fetch_data_inner.return_value = []
+    assert spider._fetch_data_prefetched('key', 2) == []
+    assert spider._fetch_data_inner.call_count == 2
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_make_requests_from_data_batch_default(connection):
+    spider = MySpider.from_crawler(get_crawler())
+    reqs = spider.make_requests_from_data_batch(
+        [b'http://example.com/1', b'  ', b'http://example.com/2\n'])
+    assert [req.url if req else None for req in reqs] == [
+        'http://example.com/1', None, 'http://example.com/2']
+    assert all(req.dont_filter for req in reqs if req)
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_make_requests_from_data_batch_override(connection):
+    class CustomSpider(MySpider):
+        def make_request_from_data(self, data):
+            return MockRequest(data.decode() + '#custom')
+
+    spider = CustomSpider.from_crawler(get_crawler())
+    reqs = spider.make_requests_from_data_batch([b'http://example.com/1'])
+    assert reqs == [MockRequest('http://example.com/1#custom')]
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_next_requests_skips_pop_when_queue_empty(connection):
+    spider = MySpider.from_crawler(get_crawler())
+    spider._size_cmd = mock.Mock(return_value=0)
+    spider.fetch_data = mock.Mock()
+    assert list(spider.next_requests()) == []
+    spider._size_cmd.assert_called_once_with(spider.redis_key)
+    spider.fetch_data.assert_not_called()
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_next_fetch_count_falls_back_to_batch_size(connection):
+    spider = MySpider.from_crawler(get_crawler())
+    # No engine state available (e.g. during start_requests).
+    assert spider._next_fetch_count() == spider.redis_batch_size
+    # A full pool fetches nothing.
+    spider.urls_in_work = mock.Mock(return_value=spider.pool_size + 5)
+    assert spider._next_fetch_count() == 0
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_urls_in_work_reads_private_slot(connection):
+    spider = MySpider.from_crawler(get_crawler())
+    # Newer Scrapy exposes the slot as engine._slot only.
+    engine = mock.Mock(spec=['_slot', 'running'])
+    engine._slot = mock.Mock(scheduler=[1, 2], inprogress={3})
+    engine.running = True
+    spider.crawler = mock.Mock(engine=engine)
+    assert spider.urls_in_work() == 3
+    assert spider._next_fetch_count() == spider.pool_size - 3
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_async_client_disables_prefetch(connection):
+    crawler = get_crawler()
+    crawler.settings.setdict({
+        'REDIS_ASYNC_CLIENT': True,
+        'REDIS_START_URLS_PREFETCH_BATCHES': 3,
+    })
+    spider = MySpider.from_crawler(crawler)
+    assert spider.redis_async
+    assert spider._prefetch_batches == 1
+    assert spider.fetch_data == spider._pop_list_queue_async
+
+
+@mock.patch('scrapy_redis.spiders.connection')
+def test_async_schedule_consumes_fetch_failure(connection):
+    crawler = get_crawler()
+    crawler.settings.setdict({'REDIS_ASYNC_CLIENT': True})
+    spider = MySpider.from_crawler(crawler)
+    d = Deferred()
+    spider.fetch_data = mock.Mock(return_value=d)
+    spider.schedule_next_requests()
+    d.errback(ValueError('boom'))
+    # The errback logged and swallowed the failure instead of leaving an
+    # unhandled Deferred error behind.
+    assert d.called
+    assert d.result is None